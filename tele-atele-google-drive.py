@@ -9,15 +9,36 @@ al grupo destino manteniendo el orden de las partes.
 """
 
 import re
+import array
 import os
 import asyncio
-import requests
+import aiohttp
+import anyio
 import json
+import signal
+import sqlite3
 import sys
-import hashlib
+import time
+import concurrent.futures
+import contextlib
+import collections
+import itertools
+import operator
+import xxhash
+from typing import NamedTuple
 from tqdm import tqdm
+from tqdm.asyncio import tqdm as atqdm
 
 from telethon import TelegramClient
+from telethon.tl.types import (InputMessagesFilterUrl, InputMessagesFilterDocument, DocumentAttributeFilename, Channel,
+                               MessageMediaPhoto, MessageMediaDocument, MessageMediaWebPage)
+from telethon.errors import FloodWaitError, MediaInvalidError, ChatForwardsRestrictedError
+
+# datasketch es opcional: sin él solo se detectan duplicados exactos
+try:
+    from datasketch import MinHash, MinHashLSH
+except ImportError:
+    MinHashLSH = None
 
 # ============================
 # Configuración de Telegram
@@ -36,9 +57,181 @@ DOWNLOAD_DIR = "downloads"
 if not os.path.exists(DOWNLOAD_DIR):
     os.makedirs(DOWNLOAD_DIR)
 
-# Conjunto para verificar archivos duplicados (utilizamos el ID de Google Drive)
+# Cantidad máxima de IDs que Telegram acepta en una sola petición de mensajes
+LOTE_IDS = 100
+# Páginas de historial pedidas en paralelo al recorrer un canal o supergrupo
+PREFETCH_PAGINAS = 8
+
+# Créditos que consume cada reenvío en el Throttle: subir medios cuesta más que enviar texto
+COSTO_TEXTO = 1
+COSTO_MEDIA = 3
+# Reenvíos exitosos seguidos tras los que el Throttle recupera un lugar de concurrencia quitado por un FLOOD_WAIT
+EXITOS_RECUPERACION = 50
+
+# Descargas de Google Drive por rangos HTTP
+PARTES_DESCARGA = 8          # Cantidad de rangos en los que se divide cada archivo
+MAX_RANGOS_SIMULTANEOS = 8   # Límite de rangos en vuelo para no provocar bloqueos por exceso de peticiones
+TAM_BLOQUE = 262144          # Tamaño de cada bloque leído del socket (256 KiB)
+TAM_COPIA = 1 << 20          # Tamaño de bloque de la descarga secuencial (1 MiB)
+
+# Índice persistente para verificar duplicados entre ejecuciones: archivos de Google Drive ya descargados
+# (por ID) y huellas de mensajes ya presentes en el destino de cada par origen/destino
+DEDUP_DB = "dedup.db"
+dedup = sqlite3.connect(DEDUP_DB)
+dedup.execute("CREATE TABLE IF NOT EXISTS seen(fid TEXT PRIMARY KEY)")
+dedup.execute("CREATE TABLE IF NOT EXISTS seen_pair(pair TEXT, h INTEGER, PRIMARY KEY(pair, h))")
+# Archivos de Google Drive ya descargados en esta ejecución (por ID). 'seen' se escribe recién al enviarlos
+# y la descarga puede ir varias partes por delante del envío.
 procesados = set()
 
+# Detección de textos casi duplicados con MinHash-LSH (requiere datasketch)
+LSH_UMBRAL = 0.9       # Similitud de Jaccard mínima para considerar dos textos casi iguales
+LSH_PERMUTACIONES = 64
+LSH_NGRAMA = 5         # Longitud de los fragmentos de caracteres que se comparan
+
+# Tipos de huella digital; se usan como semilla del hash para que tipos distintos no coincidan
+_FP_TXT = 1
+_FP_DOC_ID = 3
+_FP_FOTO = 4
+# Nombre exacto y tamaño del documento. El tipo 2 (solo el nombre en minúsculas) ya no se usa, así que las
+# huellas de ese tipo guardadas en dedup.db por versiones anteriores no coinciden con ninguna nueva.
+_FP_DOC = 5
+_MASK64 = (1 << 64) - 1
+# Valor que ocupa el lugar de "sin huella" en los arreglos de huellas (un hash real de 0 es despreciable)
+_SIN_HUELLA = 0
+# Función de hash de las huellas (XXH3 de 64 bits, devuelve directamente un entero)
+_H = xxhash.xxh3_64_intdigest
+
+# Expresiones regulares precompiladas
+_DRIVE_ID_RE = re.compile(r'/d/([a-zA-Z0-9_-]+)')
+# Encabezado "Juego: ..., Parte: N" o enlace, reconocidos en una sola pasada sobre el texto
+_MSG_RE = re.compile(r"(?P<hdr>Juego:\s*(?P<juego>.*?),\s*Parte:\s*(?P<parte>\d+))|(?P<url>https?://\S+)",
+                     re.IGNORECASE)
+_PHONE_RE = re.compile(r'^\+\d{10,15}$')
+_RANGE_RE = re.compile(r'(\d+)(?:\s*-\s*(\d+))?')
+
+class TokenBucket:
+    """
+    Limitador de tasa por cubeta de fichas: permite en promedio 'rate' peticiones por segundo,
+    con ráfagas de hasta 'capacity' peticiones.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, costo=1):
+        """Espera hasta que haya 'costo' fichas disponibles y las consume."""
+        async with self._lock:
+            while True:
+                # La capacidad puede bajar mientras se espera (reducir()); el costo se recorta en cada vuelta
+                # para que nunca supere las fichas que la cubeta puede llegar a tener
+                c = min(costo, self.capacity)
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= c:
+                    self.tokens -= c
+                    return
+                await asyncio.sleep((c - self.tokens) / self.rate)
+
+    def reducir(self):
+        """Reduce la tasa y la ráfaga a la mitad, por ejemplo tras un FLOOD_WAIT de Telegram."""
+        self.rate /= 2
+        self.capacity = max(1.0, self.capacity / 2)
+        self.tokens = min(self.tokens, self.capacity)
+
+    def aumentar(self, rate_max, capacity_max):
+        """Duplica la tasa y la ráfaga, sin superar 'rate_max' y 'capacity_max'; deshace un reducir()."""
+        self.rate = min(rate_max, self.rate * 2)
+        self.capacity = min(capacity_max, self.capacity * 2)
+
+class CasiDuplicados:
+    """
+    Índice MinHash-LSH de textos para detectar mensajes casi idénticos (por ejemplo, reenvíos con un carácter
+    cambiado) que la huella exacta no reconoce. Los textos se comparan por fragmentos de LSH_NGRAMA caracteres.
+    Dos textos con enlaces de Google Drive distintos nunca se consideran casi idénticos: las partes de un juego
+    suelen compartir la descripción y diferir solo en el número de parte y el enlace.
+    """
+    def __init__(self, umbral=LSH_UMBRAL, num_perm=LSH_PERMUTACIONES):
+         self.lsh = MinHashLSH(threshold=umbral, num_perm=num_perm)
+         self.num_perm = num_perm
+         # IDs de Google Drive de cada texto del índice, por posición
+         self.enlaces = []
+
+    def _firma(self, texto):
+         texto = texto.lower()
+         mh = MinHash(num_perm=self.num_perm)
+         mh.update_batch([texto[i:i + LSH_NGRAMA].encode("utf-8") for i in range(max(1, len(texto) - LSH_NGRAMA + 1))])
+         return mh
+
+    def contiene(self, texto):
+         """Indica si algún texto del índice, con los mismos enlaces de Google Drive, se parece al texto dado."""
+         enlaces = frozenset(_DRIVE_ID_RE.findall(texto))
+         return any(self.enlaces[k] == enlaces for k in self.lsh.query(self._firma(texto)))
+
+    def agregar(self, texto):
+         """Agrega un texto ya recortado al índice."""
+         self.lsh.insert(len(self.enlaces), self._firma(texto))
+         self.enlaces.append(frozenset(_DRIVE_ID_RE.findall(texto)))
+
+class Parte(NamedTuple):
+    """Una parte de un juego: su número y el enlace de Google Drive. Se ordena por número de parte."""
+    parte: int
+    url: str
+
+class Throttle:
+    """
+    Límite combinado para las peticiones a Telegram: como máximo 'concurrency' en vuelo y, en promedio,
+    'capacity' créditos cada 'period' segundos. Cada petición consume los créditos que indique su tipo.
+    La concurrencia usa un anyio.CapacityLimiter, cuyo total se puede ajustar mientras hay peticiones en vuelo.
+    """
+    def __init__(self, capacity, period=1.0, concurrency=10):
+        self.concurrency = concurrency
+        self.rate = capacity / period
+        self.capacity = capacity
+        self.limiter = anyio.CapacityLimiter(concurrency)
+        self.bucket = TokenBucket(self.rate, capacity)
+        self.exitos = 0
+        # Fin de la espera pedida por el último FLOOD_WAIT que redujo los límites
+        self.reducido_hasta = 0.0
+
+    @contextlib.asynccontextmanager
+    async def reservar(self, costo=1):
+        """Ocupa un lugar de concurrencia y consume 'costo' créditos mientras dura el bloque."""
+        async with self.limiter:
+            await self.bucket.acquire(costo)
+            yield
+
+    def reducir(self, espera=0):
+        """
+        Reduce la tasa de créditos a la mitad y quita un lugar de concurrencia (dejando al menos uno),
+        por ejemplo tras un FLOOD_WAIT de Telegram que pide esperar 'espera' segundos.
+        Las peticiones en vuelo reciben el mismo FLOOD_WAIT casi a la vez; dentro de esa espera solo
+        la primera reduce los límites.
+        """
+        ahora = time.monotonic()
+        if ahora < self.reducido_hasta:
+            return
+        self.reducido_hasta = ahora + espera
+        self.bucket.reducir()
+        self.limiter.total_tokens = max(1, self.limiter.total_tokens - 1)
+        self.exitos = 0
+
+    def exito(self):
+        """
+        Registra una petición exitosa; cada EXITOS_RECUPERACION seguidas se devuelve un lugar de concurrencia
+        y se duplica la tasa de créditos, sin superar los valores configurados.
+        """
+        self.exitos += 1
+        if self.exitos >= EXITOS_RECUPERACION:
+            self.exitos = 0
+            if self.limiter.total_tokens < self.concurrency:
+                self.limiter.total_tokens += 1
+            self.bucket.aumentar(self.rate, self.capacity)
+
 # ============================
 # Funciones Auxiliares
 # ============================
@@ -47,7 +240,7 @@ def extract_drive_file_id(url):
     Extrae el ID del archivo de Google Drive de la URL.
     Ejemplo de URL: https://drive.google.com/file/d/FILE_ID/view?usp=sharing
     """
-    match = re.search(r'/d/([a-zA-Z0-9_-]+)', url)
+    match = _DRIVE_ID_RE.search(url)
     if match:
         return match.group(1)
     return None
@@ -58,63 +251,151 @@ def parse_message(message_text):
     Se espera que el mensaje tenga el formato:
     "Juego: <nombre_del_juego>, Parte: <numero> - <enlace_google_drive>"
     """
-    # Buscamos el patrón del juego y la parte
-    pattern = r"Juego:\s*(?P<juego>.*?),\s*Parte:\s*(?P<parte>\d+)"
-    match = re.search(pattern, message_text, re.IGNORECASE)
-    if not match:
-        return None, None, None
-    juego = match.group("juego").strip()
-    parte = int(match.group("parte"))
-    # Buscar el enlace de Google Drive en el mensaje (se toma el primer enlace que contenga drive.google.com)
-    drive_url = None
-    urls = re.findall(r'(https?://\S+)', message_text)
-    for url in urls:
-        if "drive.google.com" in url:
-            drive_url = url
+    # Un único recorrido del texto: se toma el primer encabezado y el primer enlace de drive.google.com
+    juego = parte = drive_url = None
+    for match in _MSG_RE.finditer(message_text):
+        if match.group("hdr"):
+            if juego is None:
+                juego = match.group("juego").strip()
+                parte = int(match.group("parte"))
+        elif drive_url is None and "drive.google.com" in match.group("url"):
+            drive_url = match.group("url")
+        if juego is not None and drive_url is not None:
             break
+    if juego is None:
+        return None, None, None
     return juego, parte, drive_url
 
 def validar_telefono(telefono):
     """Valida que el número de teléfono esté en formato internacional. Ejemplo: +12345678901"""
-    import re
-    pattern = re.compile(r'^\+\d{10,15}$')
-    return pattern.match(telefono) is not None
+    return _PHONE_RE.match(telefono) is not None
+
+def _hash_id(tipo, ident):
+    """Huella de 64 bits de un ID de Telegram (entero con signo de 64 bits) para el tipo dado."""
+    return _H(ident.to_bytes(8, "little", signed=True), seed=tipo)
 
-def compute_fingerprint(msg):
+def _nombre_archivo(doc):
+    """Devuelve el nombre de archivo de un documento de Telegram, o None si no tiene."""
+    try:
+         for attr in doc.attributes:
+              if isinstance(attr, DocumentAttributeFilename):
+                   return attr.file_name
+    except Exception:
+         pass
+    return None
+
+def compute_fingerprint(msg, texto=None):
     """
-    Calcula una huella digital para el mensaje.
-    Si hay texto (o caption) no vacío, se utiliza un MD5 del contenido.
-    Si no, para documentos se usa un MD5 del nombre de archivo, y en su defecto se usa el ID.
-    Para fotos o medios se utiliza el ID.
+    Calcula una huella digital de 64 bits para el mensaje (un entero sin signo), usando el tipo como semilla.
+    Si hay texto (o caption) no vacío, se utiliza un XXH3 de 64 bits del contenido.
+    Si no, para documentos se usa un XXH3 del nombre de archivo (respetando mayúsculas) junto con su tamaño,
+    para que dos archivos distintos con el mismo nombre no se confundan; sin nombre se usa el ID.
+    Para fotos se utiliza el ID de la foto.
+    Para otros medios retorna None: el ID del mensaje no sirve para comparar entre chats distintos.
+    'texto' es el texto del mensaje ya recortado, si quien llama lo calculó antes.
     """
-    if msg.message and msg.message.strip():
-         contenido = msg.message.strip().lower().encode("utf-8")
-         return "txt:" + hashlib.md5(contenido).hexdigest()
-    elif msg.document:
+    if texto is None:
+         texto = msg.message.strip() if msg.message else ""
+    if texto:
+         return _H(texto.lower().encode("utf-8"), seed=_FP_TXT)
+    doc = msg.document
+    if doc:
+         nombre = _nombre_archivo(doc)
+         if nombre is not None:
+              tam = getattr(doc, "size", None) or 0
+              return _H(nombre.strip().encode("utf-8") + tam.to_bytes(8, "little"), seed=_FP_DOC)
+         return _hash_id(_FP_DOC_ID, doc.id)
+    photo = msg.photo
+    if photo:
          try:
-              for attr in msg.document.attributes:
-                  if attr.__class__.__name__ == "DocumentAttributeFilename":
-                      nombre = attr.file_name.strip().lower().encode("utf-8")
-                      return "doc:" + hashlib.md5(nombre).hexdigest()
-              return "doc:" + str(msg.document.id)
+              return _hash_id(_FP_FOTO, photo.id)
          except Exception:
-              return "doc:" + str(msg.document.id)
+              return None
+    return None
+
+def _preview(msg, texto=None):
+    """
+    Devuelve una vista previa corta del mensaje para mostrarla en la lista de selección.
+    'texto' es el texto del mensaje ya recortado, si quien llama lo calculó antes.
+    """
+    if texto is None:
+         texto = msg.message.strip() if msg.message else ""
+    if texto:
+         return texto[:30].replace("\n", " ")
+    doc = msg.document
+    if doc:
+         file_name = _nombre_archivo(doc)
+         if file_name:
+              return f"[Documento] {file_name}"
+         return "[Documento]"
     elif msg.photo:
-         try:
-              return "photo:" + str(msg.photo.id)
-         except Exception:
-              return "photo:" + str(msg.id)
+         return "[Foto]"
     elif msg.media:
-         return "media:" + str(msg.id)
-    return None
+         return "[Media]"
+    return "[Sin contenido]"
+
+PROMPT_SELECCION = "Ingrese 'todos' para pasar todos los mensajes o ingrese los índices separados por coma (ej: 0,1,3-5): "
+
+def _leer_rangos(seleccion):
+    """
+    Devuelve los rangos inclusivos (inicio, fin) de una selección de índices separados por coma
+    (ej: 0,1,3-5 o 3 - 5). Informa las partes que no son un índice ni un rango y las omite.
+    """
+    rangos = []
+    for parte in seleccion.split(","):
+         parte = parte.strip()
+         if not parte:
+              continue
+         m = _RANGE_RE.fullmatch(parte)
+         if m is None:
+              print(f"Error procesando el índice {parte}: no es un índice ni un rango, omitiendo...")
+              continue
+         inicio = int(m.group(1))
+         rangos.append((inicio, int(m.group(2)) if m.group(2) else inicio))
+    return rangos
+
+def parsear_seleccion(seleccion, total, rangos=None):
+    """
+    Convierte la selección del usuario en índices de mensajes dentro de [0, total).
+    Acepta 'todos' o índices sueltos y rangos inclusivos separados por coma (ej: 0,1,3-5).
+    Los rangos se recortan al total; los índices fuera de rango se omiten.
+    'rangos' es el resultado de _leer_rangos(seleccion), si quien llama lo calculó antes.
+    """
+    if seleccion == "todos":
+         return range(total)
+    if rangos is None:
+         rangos = _leer_rangos(seleccion)
+    indices = array.array('i')
+    for inicio, fin in rangos:
+         if inicio >= total:
+              print(f"Índice {inicio} fuera de rango, omitiendo...")
+              continue
+         indices.extend(range(inicio, min(fin, total - 1) + 1))
+    return indices
+
+def cargar_huellas(par):
+    """Devuelve las huellas guardadas en ejecuciones anteriores para el par origen/destino 'par'."""
+    # SQLite guarda enteros con signo de 64 bits; las huellas se almacenan desplazadas a ese rango
+    return {h & _MASK64 for (h,) in dedup.execute("SELECT h FROM seen_pair WHERE pair=?", (par,))}
+
+def guardar_huellas(par, huellas):
+    """Guarda las huellas del destino para el par origen/destino 'par', para la próxima ejecución."""
+    dedup.executemany("INSERT OR IGNORE INTO seen_pair(pair, h) VALUES (?, ?)",
+                      ((par, h - (1 << 64) if h >> 63 else h) for h in huellas))
+    dedup.commit()
 
 def safe_input(prompt):
     """Realiza una entrada segura que atrapa KeyboardInterrupt para salir limpiamente."""
+    # Dentro de asyncio.run, Ctrl+C solo cancela la tarea principal y input() seguiría esperando;
+    # mientras se espera la respuesta se restaura el manejador que lanza KeyboardInterrupt
+    previo = signal.signal(signal.SIGINT, signal.default_int_handler)
     try:
          return input(prompt)
     except KeyboardInterrupt:
          print("\nInterrupción detectada. Cerrando el programa...")
          sys.exit(0)
+    finally:
+         signal.signal(signal.SIGINT, previo)
 
 def cargar_config():
     """Carga la configuración desde 'config.json'. Si no existe, solicita al usuario y la guarda."""
@@ -136,106 +417,286 @@ def cargar_config():
               json.dump(config, f)
          return config
 
-def download_from_google_drive(url, dest_folder=DOWNLOAD_DIR):
+def crear_sesion_http():
+    """
+    Crea la sesión HTTP para las descargas de Google Drive, con un pool de conexiones reutilizables.
+    Debe crearse una sola vez por ejecución y cerrarse al terminar, para que las conexiones y los
+    handshakes TLS se aprovechen entre todas las partes descargadas.
+    """
+    connector = aiohttp.TCPConnector(limit=16, ttl_dns_cache=300, keepalive_timeout=60)
+    return aiohttp.ClientSession(connector=connector)
+
+async def _descargar_secuencial(session, download_url, local_filename):
+    """Descarga el archivo completo con una sola petición, en bloques de 1 MiB."""
+    async with session.get(download_url) as r:
+        r.raise_for_status()
+        with open(local_filename, 'wb', buffering=TAM_COPIA) as f:
+            async for chunk in r.content.iter_chunked(TAM_COPIA):
+                f.write(chunk)
+
+async def _descargar_por_rangos(session, sem, download_url, local_filename, size):
+    """Descarga el archivo en varios rangos de bytes en paralelo, escribiendo cada uno en su posición con os.pwrite."""
+    loop = asyncio.get_running_loop()
+    paso = -(-size // min(PARTES_DESCARGA, size))
+    rangos = [(lo, min(lo + paso, size)) for lo in range(0, size, paso)]
+
+    async def fetch_range(fd, lo, hi):
+        async with sem:
+            async with session.get(download_url, headers={"Range": f"bytes={lo}-{hi - 1}"}) as r:
+                if r.status != 206:
+                    raise RuntimeError(f"el servidor no respetó el rango {lo}-{hi - 1} (HTTP {r.status})")
+                offset = lo
+                async for buf in r.content.iter_chunked(TAM_BLOQUE):
+                    await loop.run_in_executor(None, os.pwrite, fd, buf, offset)
+                    offset += len(buf)
+        if offset != hi:
+            raise RuntimeError(f"rango {lo}-{hi - 1} incompleto")
+
+    fd = os.open(local_filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.ftruncate(fd, size)
+        # Se espera a todos los rangos antes de cerrar el descriptor, aunque alguno falle
+        resultados = await asyncio.gather(*(fetch_range(fd, lo, hi) for lo, hi in rangos),
+                                          return_exceptions=True)
+    finally:
+        os.close(fd)
+    for resultado in resultados:
+        if isinstance(resultado, BaseException):
+            raise resultado
+
+async def download_from_google_drive_async(url, session, sem, dest_folder=DOWNLOAD_DIR):
     """
-    Descarga un archivo desde Google Drive dado su URL.
-    Retorna la ruta del archivo descargado o None en caso de error.
+    Descarga un archivo desde Google Drive dado su URL, usando la sesión HTTP compartida.
+    Si el servidor informa el tamaño y admite rangos, se piden varios rangos de bytes en paralelo;
+    si no (o si la consulta HEAD falla), se descarga con una sola petición GET.
+    Retorna la ruta del archivo descargado o None en caso de error. El archivo se registra como procesado
+    recién cuando se envía al destino (ver _uploader).
     """
     file_id = extract_drive_file_id(url)
     if not file_id:
         print("No se pudo extraer el ID del archivo de la URL:", url)
         return None
-    
+
     # Verificar duplicados
-    if file_id in procesados:
+    if file_id in procesados or dedup.execute("SELECT 1 FROM seen WHERE fid=?", (file_id,)).fetchone():
         print("Archivo ya procesado (duplicado):", file_id)
         return None
-    
+
     download_url = "https://docs.google.com/uc?export=download&id=" + file_id
     local_filename = os.path.join(dest_folder, file_id)
-    
+
     try:
-        with requests.get(download_url, stream=True) as r:
+        async with session.head(download_url, allow_redirects=True) as r:
             r.raise_for_status()
-            with open(local_filename, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-        procesados.add(file_id)
-        print(f"Descargado: {local_filename}")
-        return local_filename
+            size = r.content_length
+            acepta_rangos = r.headers.get("Accept-Ranges", "").lower() == "bytes"
+            # Se reutiliza la URL final para no repetir las redirecciones en cada petición
+            download_url = str(r.url)
+    except Exception as e:
+        # Algunos servidores o proxies rechazan HEAD; la descarga secuencial solo necesita el GET
+        print("No se pudo consultar el tamaño del archivo, se descargará con una sola petición:", e)
+        size = None
+        acepta_rangos = False
+
+    try:
+        if size and acepta_rangos and hasattr(os, "pwrite"):
+            await _descargar_por_rangos(session, sem, download_url, local_filename, size)
+        else:
+            await _descargar_secuencial(session, download_url, local_filename)
     except Exception as e:
         print("Error descargando el archivo:", e)
+        try:
+            os.remove(local_filename)
+        except OSError:
+            pass
         return None
+    procesados.add(file_id)
+    print(f"Descargado: {local_filename}")
+    return local_filename
+
+async def _downloader(queue, juego, partes, session, sem):
+    """Descarga las partes en orden y las encola para su envío. Al terminar encola None como señal de fin."""
+    try:
+        for parte, drive_url in partes:
+            # Descargar archivo desde Google Drive
+            archivo = await download_from_google_drive_async(drive_url, session, sem)
+            if archivo:
+                await queue.put((parte, archivo, extract_drive_file_id(drive_url)))
+            else:
+                print(f"Saltando la parte {parte} de {juego} por error en descarga o por duplicado.")
+    finally:
+        await queue.put(None)
+
+async def _uploader(queue, client, destino, juego):
+    """Toma de la cola las partes descargadas y las envía al grupo destino en el mismo orden."""
+    while True:
+        item = await queue.get()
+        if item is None:
+            break
+        parte, archivo, file_id = item
+        try:
+            print(f"Enviando parte {parte} de {juego} al grupo destino...")
+            # Enviar el archivo al grupo destino con un caption que indique juego y parte
+            await client.send_file(destino, archivo, caption=f"{juego} - Parte {parte}")
+            # Solo una parte enviada cuenta como procesada; si el envío falla se reintenta en la próxima ejecución
+            dedup.execute("INSERT OR IGNORE INTO seen(fid) VALUES (?)", (file_id,))
+            dedup.commit()
+        except Exception as e:
+            print("Error enviando archivo al grupo destino:", e)
+        finally:
+            # Luego de enviar, eliminamos el archivo descargado
+            try:
+                os.remove(archivo)
+            except Exception as e:
+                print("Error al eliminar el archivo:", e)
 
-async def process_game(client, destino, juego, partes):
+async def process_game(client, destino, juego, partes, session):
     """
-    Procesa un juego: para cada parte, descarga y envía al grupo destino en orden.
+    Procesa un juego: descarga las partes y las envía al grupo destino en orden.
+    La descarga de la parte siguiente se solapa con el envío de la anterior; la cola acotada
+    limita cuántas partes descargadas pueden esperar en disco.
+    'partes' es una lista de Parte; 'session' es la sesión HTTP compartida creada con crear_sesion_http().
     """
     print(f"Procesando juego: {juego} con {len(partes)} partes.")
     # Ordenar las partes por número
-    partes.sort(key=lambda x: x["parte"])
-    for parte_info in partes:
-        drive_url = parte_info["url"]
-        parte = parte_info["parte"]
-        # Descargar archivo desde Google Drive
-        archivo = download_from_google_drive(drive_url)
-        if archivo:
-            try:
-                print(f"Enviando parte {parte} de {juego} al grupo destino...")
-                # Enviar el archivo al grupo destino con un caption que indique juego y parte
-                await client.send_file(destino, archivo, caption=f"{juego} - Parte {parte}")
-            except Exception as e:
-                print("Error enviando archivo al grupo destino:", e)
-            finally:
-                # Luego de enviar, eliminamos el archivo descargado
-                try:
-                    os.remove(archivo)
-                except Exception as e:
-                    print("Error al eliminar el archivo:", e)
-        else:
-            print(f"Saltando la parte {parte} de {juego} por error en descarga o por duplicado.")
+    partes.sort()
+    sem = asyncio.Semaphore(MAX_RANGOS_SIMULTANEOS)
+    queue = asyncio.Queue(maxsize=3)
+    await asyncio.gather(
+        _downloader(queue, juego, partes, session, sem),
+        _uploader(queue, client, destino, juego),
+    )
 
-async def forward_message(client, destino, source_entity, msg, idx, sem):
-    """Reenvía un mensaje: si tiene contenido multimedia, lo descarga y lo vuelve a subir; si es solo texto, lo envía.
-    Se utiliza un semáforo para controlar la concurrencia."""
-    async with sem:
-         try:
-              # Si el mensaje contiene medios (fotos, documentos, etc.), se descarga y se reenvía el archivo.
-              if msg.photo or msg.document or msg.media:
-                   print(f"Procesando mensaje {idx} con archivo, descargando y reenviando...")
-                   pbar = None
-                   def progress_callback(current, total):
-                       nonlocal pbar
-                       if pbar is None:
-                           pbar = tqdm(total=total, unit='B', unit_scale=True, desc=f"Archivo {idx}", 
-                                       colour="green", bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{percentage:3.0f}%]", leave=False)
-                       pbar.update(current - pbar.n)
-                       if current >= total:
-                           pbar.close()
-                   file_path = await client.download_media(msg, progress_callback=progress_callback)
-                   if file_path:
-                        caption = msg.message if msg.message else ""
-                        # Enviar el archivo (foto, documento o media) junto con su caption
-                        await client.send_file(destino, file_path, caption=caption)
-                        try:
-                             os.remove(file_path)
-                        except Exception as e:
-                             print(f"Error al eliminar archivo temporal {file_path}: {e}")
-                        preview = caption[:30] if caption else "[Archivo sin caption]"
-                   else:
-                        preview = "[Error al descargar el archivo]"
-              else:
-                   # Si no tiene medios, se envía el mensaje de texto
-                   if msg.message:
-                        preview = msg.message[:30].replace("\n", " ")
+async def recorrer_historial(client, entity, filtro=None):
+    """
+    Recorre el historial de 'entity' desde el mensaje más antiguo hasta el más moderno.
+    En canales y supergrupos los IDs de mensaje son consecutivos, así que el historial se divide en páginas
+    de LOTE_IDS IDs y se piden hasta PREFETCH_PAGINAS páginas en paralelo, entregándolas en orden.
+    Con un filtro de búsqueda, o en otros chats, se usa el recorrido secuencial de Telethon.
+    """
+    if filtro is not None or not isinstance(entity, Channel):
+         async for message in client.iter_messages(entity, limit=None, filter=filtro, reverse=True):
+              yield message
+         return
+    ultimos = await client.get_messages(entity, limit=1)
+    if not ultimos:
+         return
+
+    def pedir(lo):
+         # Mensajes con ID en (lo, lo + LOTE_IDS]
+         return asyncio.create_task(client.get_messages(entity, limit=LOTE_IDS, offset_id=lo + LOTE_IDS + 1, min_id=lo))
+
+    inicios = iter(range(0, ultimos[0].id, LOTE_IDS))
+    en_vuelo = collections.deque(pedir(lo) for lo in itertools.islice(inicios, PREFETCH_PAGINAS))
+    try:
+         while en_vuelo:
+              pagina = await en_vuelo.popleft()
+              siguiente = next(inicios, None)
+              if siguiente is not None:
+                   en_vuelo.append(pedir(siguiente))
+              for message in reversed(pagina):
+                   yield message
+    finally:
+         # Si quien recorre se detiene antes de tiempo, no dejar páginas pedidas sin esperar
+         for task in en_vuelo:
+              task.cancel()
+
+def _eliminar_temporal(path):
+    """Elimina un archivo temporal informando el error, si lo hay, sin propagarlo."""
+    try:
+         os.unlink(path)
+    except Exception as e:
+         print(f"Error al eliminar archivo temporal {path}: {e}")
+
+async def _borrar_temporales(delete_queue, io_executor):
+    """Elimina en segundo plano los archivos encolados en 'delete_queue' hasta recibir None."""
+    loop = asyncio.get_running_loop()
+    pendientes = []
+    while True:
+         path = await delete_queue.get()
+         if path is None:
+              break
+         pendientes.append(loop.run_in_executor(io_executor, _eliminar_temporal, path))
+    await asyncio.gather(*pendientes)
+
+async def forward_message(client, destino, source_entity, msg, idx, throttle, fp, dest_fp_set, delete_queue):
+    """Reenvía un mensaje: si tiene una foto o documento, lo reenvía por referencia; si eso no es posible
+    o tiene otro contenido multimedia, lo descarga y lo vuelve a subir; si es solo texto (incluida la vista
+    previa de un enlace, que se regenera en el destino), lo envía.
+    Se utiliza un Throttle que limita la concurrencia y los créditos por período; los mensajes con medios
+    consumen COSTO_MEDIA créditos y los de texto COSTO_TEXTO.
+    Ante un FLOOD_WAIT de Telegram se reduce la tasa a la mitad, se espera lo indicado y se reintenta.
+    'fp' es la huella ya calculada del mensaje; si el reenvío tiene éxito se agrega a 'dest_fp_set'.
+    Los archivos temporales se encolan en 'delete_queue' para borrarlos fuera del límite de concurrencia."""
+    # La vista previa de un enlace no es un archivo: msg.photo y msg.document devuelven los de la vista previa,
+    # pero esos mensajes se envían como texto
+    media = msg.media
+    con_archivo = media is not None and not isinstance(media, MessageMediaWebPage)
+    costo = COSTO_MEDIA if con_archivo else COSTO_TEXTO
+    while True:
+         espera = 0
+         async with throttle.reservar(costo):
+              try:
+                   text = msg.message
+                   # Si el mensaje contiene medios, las fotos y documentos se reenvían primero por referencia; si no
+                   # se puede (u otro tipo de medio), se descarga el archivo y se vuelve a subir.
+                   if con_archivo:
+                        caption = text if text else ""
+                        reutilizado = False
+                        if isinstance(media, (MessageMediaPhoto, MessageMediaDocument)):
+                             # Las fotos y documentos ya alojados en Telegram se reenvían por referencia,
+                             # sin descargarlos ni volver a subirlos
+                             try:
+                                  print(f"Reenviando el archivo del mensaje {idx} sin descargarlo...")
+                                  await client.send_file(destino, media, caption=caption)
+                                  reutilizado = True
+                                  preview = caption[:30] if caption else "[Archivo sin caption]"
+                             except (MediaInvalidError, ChatForwardsRestrictedError, TypeError) as e:
+                                  print(f"No se pudo reutilizar el archivo del mensaje {idx} ({e}), se descargará.")
+                        if not reutilizado:
+                             print(f"Procesando mensaje {idx} con archivo, descargando y reenviando...")
+                             pbar = None
+                             def progress_callback(current, total):
+                                 nonlocal pbar
+                                 if pbar is None:
+                                     pbar = tqdm(total=total, unit='B', unit_scale=True, desc=f"Archivo {idx}", 
+                                                 colour="green", bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{percentage:3.0f}%]", leave=False)
+                                 pbar.update(current - pbar.n)
+                                 if current >= total:
+                                     pbar.close()
+                             file_path = await client.download_media(msg, progress_callback=progress_callback)
+                             if file_path:
+                                  try:
+                                       # Enviar el archivo (foto, documento o media) junto con su caption
+                                       await client.send_file(destino, file_path, caption=caption)
+                                  finally:
+                                       delete_queue.put_nowait(file_path)
+                                  preview = caption[:30] if caption else "[Archivo sin caption]"
+                             else:
+                                  raise RuntimeError("no se pudo descargar el archivo")
                    else:
-                        preview = "[Sin contenido]"
-                   print(f"Enviando mensaje {idx}: {preview}")
-                   await client.send_message(destino, msg.message)
-              print(f"Mensaje {idx} enviado correctamente.")
-         except Exception as e:
-              print(f"Error reenviando mensaje {idx}: {e}")
+                        # Si no tiene medios, se envía el mensaje de texto
+                        if text:
+                             preview = text[:30].replace("\n", " ")
+                        else:
+                             preview = "[Sin contenido]"
+                        print(f"Enviando mensaje {idx}: {preview}")
+                        await client.send_message(destino, text)
+                   print(f"Mensaje {idx} enviado correctamente.")
+                   throttle.exito()
+                   if fp is not None:
+                        dest_fp_set.add(fp)
+              except FloodWaitError as e:
+                   espera = e.seconds
+                   throttle.reducir(espera)
+              except Exception as e:
+                   print(f"Error reenviando mensaje {idx}: {e}")
+         if not espera:
+              break
+         # La espera se hace fuera del Throttle para no retener un lugar de concurrencia
+         print(f"Telegram pidió esperar {espera} s en el mensaje {idx}. Nueva tasa: {throttle.bucket.rate:.2f} créditos/s, "
+               f"{throttle.limiter.total_tokens:.0f} en paralelo.")
+         await asyncio.sleep(espera)
 
 # ============================
 # Función Principal
@@ -251,135 +712,211 @@ async def main():
          print(f"Error al iniciar el cliente de Telegram: {e}")
          return
     
-    # Obtener la lista de diálogos (grupos, canales, chats) y filtrar por aquellos que tienen título
-    dialogs = await client.get_dialogs()
-    grupos = [d.entity for d in dialogs if hasattr(d.entity, "title")]
-    if not grupos:
-         print("No se encontraron grupos disponibles.")
-         return
+    # La entidad propia ('Mensajes guardados') se pide en paralelo con la lista de diálogos
+    me_task = asyncio.create_task(client.get_entity("me"))
+    try:
+         # Obtener la lista de diálogos (grupos, canales, chats) y filtrar por aquellos que tienen título
+         dialogs = await client.get_dialogs()
+         grupos = [d.entity for d in dialogs if hasattr(d.entity, "title")]
+         if not grupos:
+              print("No se encontraron grupos disponibles.")
+              return
 
-    print("\nGrupos disponibles:")
-    for idx, grupo in enumerate(grupos):
-         print(f"{idx}: {grupo.title}")
+         print("\nGrupos disponibles:")
+         sys.stdout.write("\n".join(f"{idx}: {grupo.title}" for idx, grupo in enumerate(grupos)) + "\n")
 
-    # Selección interactiva del grupo ORIGEN y del destino o 'guardados'
-    try:
-         source_index = int(safe_input("Ingrese el número del grupo ORIGEN: ").strip())
-         destino_input = safe_input("Ingrese el número del grupo DESTINO o escriba 'guardados' para enviar a 'Mensajes guardados': ").strip().lower()
-         source_entity = grupos[source_index]
-         if destino_input == "guardados":
-              destino = await client.get_entity("me")
-         else:
-              destino_index = int(destino_input)
-              if destino_index < 0 or destino_index >= len(grupos):
-                   print("Índice fuera de rango. Saliendo...")
-                   return
-              destino = grupos[destino_index]
-    except ValueError:
-         print("Entrada no válida. Debe ingresar un número o 'guardados'. Saliendo...")
-         return
+         # Selección interactiva del grupo ORIGEN y del destino o 'guardados'
+         try:
+              source_index = int(safe_input("Ingrese el número del grupo ORIGEN: ").strip())
+              destino_input = safe_input("Ingrese el número del grupo DESTINO o escriba 'guardados' para enviar a 'Mensajes guardados': ").strip().lower()
+              if source_index < 0:
+                   raise IndexError(source_index)
+              source_entity = grupos[source_index]
+              if destino_input == "guardados":
+                   destino = await me_task
+              else:
+                   destino_index = int(destino_input)
+                   if destino_index < 0:
+                        raise IndexError(destino_index)
+                   destino = grupos[destino_index]
+         except IndexError:
+              print("Índice fuera de rango. Saliendo...")
+              return
+         except ValueError:
+              print("Entrada no válida. Debe ingresar un número o 'guardados'. Saliendo...")
+              return
+    finally:
+         # Si no se usó la entidad propia, se cancela la petición o, si ya terminó con error, se recoge el error
+         # para que asyncio no lo informe como "never retrieved"
+         if not me_task.done():
+              me_task.cancel()
+         elif not me_task.cancelled():
+              me_task.exception()
     
-    # Obtener las huellas digitales de los mensajes existentes en destino para evitar duplicados
+    # Filtro opcional del lado del servidor: Telegram devuelve solo los mensajes con enlaces o con archivos
+    tipo = safe_input("Recorrer del grupo origen: [Enter] todos los mensajes, 'e' solo con enlaces, 'a' solo con archivos: ").strip().lower()
+    if tipo == "e":
+         filtro = InputMessagesFilterUrl()
+    elif tipo == "a":
+         filtro = InputMessagesFilterDocument()
+    else:
+         filtro = None
+
+    # La lista puede ser enorme; si el usuario va a elegir 'todos' no hace falta construirla ni mostrarla
+    mostrar = safe_input("¿Mostrar la lista de mensajes antes de seleccionar? (s/n): ").strip().lower() != "n"
+    # Sin lista, la selección se pide antes de recorrer el origen: si no es 'todos', basta con recorrer
+    # hasta el índice más alto pedido y el resto del historial no se descarga
+    seleccion = None
+    rangos = None
+    limite = None
+    if not mostrar:
+         seleccion = safe_input(PROMPT_SELECCION).strip().lower()
+         if seleccion != "todos":
+              rangos = _leer_rangos(seleccion)
+              limite = max((fin for _, fin in rangos), default=-1) + 1
+
     print("Obteniendo mensajes existentes en el grupo destino para evitar duplicados...")
-    dest_msgs = []
-    async for m in client.iter_messages(destino, limit=200):
-         dest_msgs.append(m)
-    dest_text_set = set()
-    for m in dest_msgs:
-         if m.message and m.message.strip():
-              dest_text_set.add(m.message.strip())
+    # Los 200 mensajes llegan en una sola respuesta
+    dest_msgs = await client.get_messages(destino, limit=200)
+    # Historial del destino (solo lectura), sumando lo recordado de ejecuciones anteriores con este mismo
+    # par origen/destino, y huellas reenviadas durante esta ejecución, por separado
+    par = f"{source_entity.id}:{destino.id}"
+    hist_fp = frozenset(fp for fp in map(compute_fingerprint, dest_msgs) if fp is not None) | cargar_huellas(par)
+    dest_fp_set = set()
+    # Opcional (config "casi_duplicados", requiere datasketch): también se omiten los textos casi idénticos
+    # a alguno del destino
+    casi = None
+    if config.get("casi_duplicados", False):
+         if MinHashLSH is None:
+              print("Para detectar mensajes casi duplicados instale datasketch; solo se omitirán los idénticos.")
+         else:
+              casi = CasiDuplicados()
+              for m in dest_msgs:
+                   if m.message and m.message.strip():
+                        casi.agregar(m.message.strip())
 
     print("Recuperando mensajes del grupo origen. Esto puede tardar dependiendo de la cantidad de mensajes...")
-    mensajes = []
-    # Recorrer TODOS los mensajes del grupo origen (sin límite)
-    async for message in client.iter_messages(source_entity, limit=None):
-         mensajes.append(message)
-    print(f"Se han recuperado {len(mensajes)} mensajes.")
- 
-    # Ordenar los mensajes de forma ascendente (desde el más antiguo hasta el más moderno)
-    mensajes.sort(key=lambda m: m.date)
-
-    print("\nLista de mensajes:")
-    for idx, mensaje in enumerate(mensajes):
-         preview = ""
-         if mensaje.message and mensaje.message.strip():
-             preview = mensaje.message[:30].replace("\n", " ")
-         elif mensaje.document:
-              file_name = None
-              try:
-                   for attr in mensaje.document.attributes:
-                        if attr.__class__.__name__ == "DocumentAttributeFilename":
-                             file_name = attr.file_name
-                             break
-              except Exception:
-                   pass
-              if file_name:
-                   preview = f"[Documento] {file_name}"
-              else:
-                   preview = "[Documento]"
-         elif mensaje.photo:
-              preview = "[Foto]"
-         elif mensaje.media:
-              preview = "[Media]"
-         else:
-              preview = "[Sin contenido]"
-         print(f"{idx}: {preview}")
+    # Datos mínimos de cada mensaje, en columnas paralelas: arreglos compactos de enteros (8 bytes por valor)
+    # en lugar de un objeto por mensaje. Las vistas previas solo se guardan si se va a mostrar la lista.
+    # El mensaje completo se vuelve a pedir al reenviarlo.
+    ids = array.array('q')
+    fps = array.array('Q')
+    previews = []
+    vistos = set()
+    duplicados = 0
+    # Recorrer el origen del más antiguo al más moderno (todo, o hasta cubrir el índice más alto pedido),
+    # descartando aquí mismo los duplicados del destino o del propio origen.
+    # Accesos que se repiten en cada iteración, resueltos una sola vez fuera del bucle
+    leer = operator.attrgetter("id", "message")
+    agregar_visto = vistos.add
+    agregar_id = ids.append
+    agregar_fp = fps.append
+    agregar_preview = previews.append
+    async with contextlib.aclosing(recorrer_historial(client, source_entity, filtro)) as historial:
+         async for message in historial:
+              if limite is not None and len(ids) >= limite:
+                   break
+              msg_id, text = leer(message)
+              # El texto se recorta una sola vez y se comparte entre la huella y la vista previa
+              texto = text.strip() if text else ""
+              fp = compute_fingerprint(message, texto)
+              if fp is not None:
+                   if fp in hist_fp or fp in vistos or (casi is not None and texto and casi.contiene(texto)):
+                        duplicados += 1
+                        continue
+                   agregar_visto(fp)
+              # Los mensajes sin huella (por ejemplo, medios sin ID estable) llegan aquí sin comparar y se conservan
+              agregar_id(msg_id)
+              agregar_fp(_SIN_HUELLA if fp is None else fp)
+              if mostrar:
+                   agregar_preview(_preview(message, texto))
+    print(f"Se han recuperado {len(ids)} mensajes ({duplicados} duplicados omitidos).")
+
+    if mostrar:
+         print("\nLista de mensajes:")
+         sys.stdout.write("\n".join(f"{idx}: {p}" for idx, p in enumerate(previews)) + "\n")
  
-    seleccion = safe_input("Ingrese 'todos' para pasar todos los mensajes o ingrese los índices separados por coma (ej: 0,1,3-5): ").strip().lower()
-    if seleccion == "todos":
-         indices = list(range(len(mensajes)))
-    else:
-         indices = []
-         for parte in seleccion.split(","):
-             parte = parte.strip()
-             if "-" in parte:
-                 try:
-                     inicio, fin = parte.split("-")
-                     inicio = int(inicio)
-                     fin = int(fin)
-                     indices.extend(range(inicio, fin+1))
-                 except Exception as e:
-                     print(f"Error procesando el rango {parte}: {e}")
-             else:
-                 try:
-                     indices.append(int(parte))
-                 except Exception as e:
-                     print(f"Error procesando el índice {parte}: {e}")
+    if seleccion is None:
+         seleccion = safe_input(PROMPT_SELECCION).strip().lower()
+    indices = parsear_seleccion(seleccion, len(ids), rangos)
  
-    # Pre-filtrar los índices seleccionados comparando solo los textos
-    nuevos_indices = []
-    for i in indices:
-         if i < 0 or i >= len(mensajes):
-              print(f"Índice {i} fuera de rango, omitiendo...")
-         else:
-              msg = mensajes[i]
-              if msg.message and msg.message.strip():
-                   txt = msg.message.strip()
-                   if txt in dest_text_set:
-                        print(f"Mensaje {i} duplicado en destino (texto idéntico). Omitiendo...")
+    # Los duplicados ya se filtraron al recorrer el origen; solo se quitan los índices repetidos
+    nuevos_indices = sorted(set(indices))
+    print(f"Se reenviarán {len(nuevos_indices)} mensajes.")
+    # Concurrencia y tasa de reenvío configurables desde config.json
+    throttle = Throttle(capacity=config.get("forward_creditos", 20), period=config.get("forward_periodo", 1.0),
+                        concurrency=config.get("forward_concurrency", 10))
+    # Telethon duerme por su cuenta ante FLOOD_WAIT de hasta 60 s, reteniendo el lugar y los créditos del Throttle;
+    # con umbral 0 todos llegan a forward_message, que reduce los límites y espera fuera del Throttle
+    client.flood_sleep_threshold = 0
+    # Los archivos temporales se borran en segundo plano, sin ocupar un lugar de concurrencia del Throttle
+    delete_queue = asyncio.Queue()
+    io_executor = concurrent.futures.ThreadPoolExecutor(4)
+    borrador = asyncio.create_task(_borrar_temporales(delete_queue, io_executor))
+    ordenado = config.get("preservar_orden", False)
+
+    async def reenviar_por_lotes():
+         """
+         Vuelve a pedir los mensajes seleccionados por ID, en lotes de LOTE_IDS (una sola petición por lote,
+         sin la pausa que Telethon intercala cuando se piden más de 300 IDs juntos), y los reenvía.
+         Mientras se reenvía un lote ya se está pidiendo el siguiente; así solo hay en memoria los mensajes
+         completos de dos lotes. Produce un valor por cada mensaje terminado.
+         """
+         lotes = [nuevos_indices[k:k + LOTE_IDS] for k in range(0, len(nuevos_indices), LOTE_IDS)]
+         if not lotes:
+              return
+         def pedir(lote):
+              return asyncio.create_task(client.get_messages(source_entity, ids=[ids[i] for i in lote]))
+         siguiente = pedir(lotes[0])
+         for n, lote in enumerate(lotes):
+              mensajes = await siguiente
+              if n + 1 < len(lotes):
+                   siguiente = pedir(lotes[n + 1])
+              pendientes = []
+              for i, msg in zip(lote, mensajes):
+                   if msg is None:
+                        print(f"Mensaje {i} ya no existe en el grupo origen. Omitiendo...")
+                        yield i
                    else:
-                        nuevos_indices.append(i)
-                        dest_text_set.add(txt)
+                        pendientes.append((i, msg))
+              if ordenado:
+                   # Se envía cada mensaje de forma secuencial para preservar el orden.
+                   for i, msg in pendientes:
+                        await forward_message(client, destino, source_entity, msg, i, throttle, fps[i] or None,
+                                              dest_fp_set, delete_queue)
+                        yield i
               else:
-                   # Si el mensaje no tiene texto (por ejemplo, multimedia sin caption) se envía de todas formas.
-                   nuevos_indices.append(i)
-    print(f"Se reenviarán {len(nuevos_indices)} mensajes después de filtrar duplicados (solo por texto).")
-    sem = asyncio.Semaphore(10)
-    nuevos_indices.sort()
-    pbar = tqdm(total=len(nuevos_indices), desc="Enviando mensajes", colour="green", unit="mensaje", 
-                bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{percentage:3.0f}%]")
-    for idx, i in enumerate(nuevos_indices):
-         # Se envía cada mensaje de forma secuencial para preservar el orden.
-         await forward_message(client, destino, source_entity, mensajes[i], i, sem)
-         pbar.update(1)
-    pbar.close()
+                   # Envío concurrente: el Throttle dentro de forward_message limita cuántos mensajes hay en vuelo
+                   tasks = [asyncio.create_task(forward_message(client, destino, source_entity, msg, i, throttle,
+                                                                fps[i] or None, dest_fp_set, delete_queue))
+                            for i, msg in pendientes]
+                   for fut in asyncio.as_completed(tasks):
+                        yield await fut
+
+    # La barra avanza a medida que termina cada mensaje, sin actualizaciones manuales
+    try:
+         async for _ in atqdm(reenviar_por_lotes(), total=len(nuevos_indices), desc="Enviando mensajes", colour="green",
+                              unit="mensaje", bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{percentage:3.0f}%]"):
+              pass
+    finally:
+         # Recordar lo que ya está en destino, aunque el reenvío se haya interrumpido
+         guardar_huellas(par, hist_fp | dest_fp_set)
+    await delete_queue.put(None)
+    await borrador
+    io_executor.shutdown()
     
     print("Procesamiento completado. Cerrando cliente...")
     await client.disconnect()
 
 if __name__ == '__main__':
+    # uvloop (opcional) reemplaza el bucle de eventos por uno basado en libuv, con menos costo por await
+    try:
+         import uvloop
+         ejecutar = uvloop.run
+    except ImportError:
+         ejecutar = asyncio.run
     try:
-         asyncio.run(main())
+         ejecutar(main())
     except KeyboardInterrupt:
          print("\nInterrupción detectada. Saliendo...")
          sys.exit(0)